@@ -1,73 +1,148 @@
+import argparse
+import copy
+import hashlib
 import json
 import traceback
 import subprocess
 import os
-from typing import Dict, List, Optional
-import requests
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+
+class ModelResultCache:
+    """Bounded LRU cache for validation and code generation results, keyed by model text"""
+
+    def __init__(self, max_size: int = 128):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[str, str, str], Dict]" = OrderedDict()
+
+    @staticmethod
+    def model_hash(model_text: str) -> str:
+        """Hash the model text, ignoring line endings and trailing whitespace"""
+        normalised = "\n".join(line.rstrip() for line in model_text.strip().splitlines())
+        return hashlib.sha256(normalised.encode('utf-8')).hexdigest()
+
+    def get(self, kind: str, model_text: str, language: str = "") -> Optional[Dict]:
+        """Return the cached result, or None on a miss"""
+        key = (self.model_hash(model_text), kind, language.lower())
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            # a copy, so callers changing the result cannot change later hits
+            return copy.deepcopy(self._entries[key])
+        self.misses += 1
+        return None
+
+    def put(self, kind: str, model_text: str, result: Dict, language: str = ""):
+        """Store a result, evicting the least recently used one when full"""
+        key = (self.model_hash(model_text), kind, language.lower())
+        self._entries[key] = copy.deepcopy(result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, model_text: Optional[str] = None):
+        """Drop all cached results for a model, or everything if no model is given"""
+        if model_text is None:
+            self._entries.clear()
+            return
+        digest = self.model_hash(model_text)
+        for key in [key for key in self._entries if key[0] == digest]:
+            del self._entries[key]
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and current size"""
+        return {"hits": self.hits, "misses": self.misses,
+                "size": len(self._entries), "max_size": self.max_size}
 
 
 class ModelValidationService:
     """Service to validate UML/model syntax using PlantUML"""
 
-    def __init__(self):
+    def __init__(self, cache: Optional[ModelResultCache] = None):
         self.plantuml_url = "http://www.plantuml.com/plantuml/txt/"
+        self.cache = cache if cache is not None else ModelResultCache()
 
     def validate_model(self, model_text: str) -> Dict:
         """Validate a PlantUML model"""
+        cached = self.cache.get("validate", model_text)
+        if cached is not None:
+            return cached
+
         try:
-            # Check basic syntax
-            if not model_text.strip().startswith("@start"):
-                return {
-                    "valid": False,
-                    "errors": ["Model must start with @startuml or @startclass"],
-                    "suggestions": ["Add @startuml at the beginning"]
-                }
+            result, cacheable = self._validate(model_text)
+        except Exception as e:
+            # not cached, the renderer may be reachable next time
+            return {
+                "valid": False,
+                "errors": [f"Validation error: {str(e)}"],
+                "suggestions": ["Check model syntax"]
+            }
 
-            if not "@end" in model_text:
-                return {
-                    "valid": False,
-                    "errors": ["Model must end with @enduml or @endclass"],
-                    "suggestions": ["Add @enduml at the end"]
-                }
+        if cacheable:
+            self.cache.put("validate", model_text, result)
+        return result
+
+    def _validate(self, model_text: str) -> Tuple[Dict, bool]:
+        """Validate the model, and say whether the result depends only on the model text"""
+        # Check basic syntax
+        if not model_text.strip().startswith("@start"):
+            return {
+                "valid": False,
+                "errors": ["Model must start with @startuml or @startclass"],
+                "suggestions": ["Add @startuml at the beginning"]
+            }, True
 
-            # Try to render it (validates syntax)
-            import base64
-            import zlib
+        if not "@end" in model_text:
+            return {
+                "valid": False,
+                "errors": ["Model must end with @enduml or @endclass"],
+                "suggestions": ["Add @enduml at the end"]
+            }, True
 
-            # PlantUML encoding
-            compressed = zlib.compress(model_text.encode('utf-8'))
-            encoded = base64.b64encode(compressed).decode('ascii')
+        # Try to render it (validates syntax)
+        import base64
+        import zlib
+        import requests
 
-            # Make request to PlantUML server
-            response = requests.get(f"{self.plantuml_url}{encoded}")
+        # PlantUML encoding
+        compressed = zlib.compress(model_text.encode('utf-8'))
+        encoded = base64.b64encode(compressed).decode('ascii')
 
-            if response.status_code == 200:
-                return {
-                    "valid": True,
-                    "errors": [],
-                    "message": "Model is syntactically valid",
-                    "rendered_text": response.text
-                }
-            else:
-                return {
-                    "valid": False,
-                    "errors": ["PlantUML server returned error"],
-                    "suggestions": ["Check syntax carefully"]
-                }
+        # Make request to PlantUML server
+        response = requests.get(f"{self.plantuml_url}{encoded}")
 
-        except Exception as e:
+        if response.status_code == 200:
+            return {
+                "valid": True,
+                "errors": [],
+                "message": "Model is syntactically valid",
+                "rendered_text": response.text
+            }, True
+        else:
+            # PlantUML answers 400 for syntax errors; anything else (5xx, 429, ...)
+            # is a server failure that may be gone on the next call
             return {
                 "valid": False,
-                "errors": [f"Validation error: {str(e)}"],
-                "suggestions": ["Check model syntax"]
-            }
+                "errors": ["PlantUML server returned error"],
+                "suggestions": ["Check syntax carefully"]
+            }, response.status_code == 400
 
 
 class CodeGenerationService:
     """Service to generate code from models"""
 
+    def __init__(self, cache: Optional[ModelResultCache] = None):
+        self.cache = cache if cache is not None else ModelResultCache()
+
     def generate_code(self, model_text: str, target_language: str = "python") -> Dict:
         """Generate code from a UML class diagram"""
+        cached = self.cache.get("generate_code", model_text, target_language)
+        if cached is not None:
+            return cached
+
         try:
             # Parse classes from PlantUML
             classes = self._parse_classes(model_text)
@@ -82,10 +157,10 @@ class CodeGenerationService:
                     "error": f"Unsupported language: {target_language}"
                 }
 
-            return {
+            result = {
                 "success": True,
                 "code": code,
-                "language": target_language,
+                "language": target_language.lower(),
                 "classes_found": len(classes)
             }
 
@@ -95,6 +170,9 @@ class CodeGenerationService:
                 "error": f"Code generation error: {str(e)}"
             }
 
+        self.cache.put("generate_code", model_text, result, target_language)
+        return result
+
     def _parse_classes(self, model_text: str) -> List[Dict]:
         """Simple parser for PlantUML class definitions"""
         classes = []
@@ -187,13 +265,17 @@ class AgenticAI:
     """Main agent that coordinates between services"""
 
     def __init__(self):
-        self.validator = ModelValidationService()
-        self.code_gen = CodeGenerationService()
+        self.cache = ModelResultCache()
+        self.validator = ModelValidationService(self.cache)
+        self.code_gen = CodeGenerationService(self.cache)
         self.ollama_url = "http://localhost:11434/api/generate"
         self.model = "llama3.2"  # or "mistral", "codellama"
 
     def call_llm(self, prompt: str, system_prompt: str = "") -> str:
         """Call local Ollama LLM"""
+        # Imported here so the CLI starts without paying for requests
+        import requests
+
         try:
             payload = {
                 "model": self.model,
@@ -268,14 +350,8 @@ If the user is just asking questions, respond normally.
         return llm_response
 
 
-def main():
-    print("=== Local Agentic AI for Model Engineering ===\n")
-    print("Make sure Ollama is running: ollama serve")
-    print("And pull a model: ollama pull llama3.2\n")
-
-    agent = AgenticAI()
-
-    # Example usage
+def run_demos(agent: AgenticAI):
+    """Run the example requests against the agent (three LLM calls)"""
     example_model = """@startuml
 class Student {
   +name: String
@@ -296,8 +372,7 @@ class Course {
     print()
     print("-" * 50)
     response = agent.process_request(
-        f"{prompt}\n{
-            example_model}"
+        f"{prompt}\n{example_model}"
     )
     print(response)
 
@@ -313,11 +388,27 @@ class Course {
     print("\n\nExample: Validating the models and generating code:")
     print("-" * 50)
     response = agent.process_request(
-        f"Please validate this model and then generate Python code:\n{
-            example_model}"
+        f"Please validate this model and then generate Python code:\n{example_model}"
     )
     print(response)
 
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Local Agentic AI for Model Engineering")
+    parser.add_argument("--demo", action="store_true",
+                        help="run the example requests before the interactive prompt")
+    args = parser.parse_args()
+
+    print("=== Local Agentic AI for Model Engineering ===\n")
+    print("Make sure Ollama is running: ollama serve")
+    print("And pull a model: ollama pull llama3.2\n")
+
+    agent = AgenticAI()
+
+    if args.demo:
+        run_demos(agent)
+
     print("\n\n=== Interactive Mode ===")
     print("Type 'quit' to exit\n")
 
@@ -2,13 +2,15 @@ import json
 import os
 
 import hydra
-import pandas as pd
-import wandb
 from omegaconf import DictConfig
+from omegaconf import OmegaConf
 
 from prompt_generation import generate_prompts
 from prompt_generation import generate_prompts_chatgpt
 from prompt_generation import generate_prompts_chatgpt_COT
+from prompt_generation import preflight_prompts
+
+from profiling import Profiler
 
 from run_llm import run_llm
 from run_llm import run_llm_chatGPT
@@ -22,20 +24,34 @@ def save_results(outputs, output_folder):
 
 
 def save_results_wandb(outputs, args):
+    # wandb and pandas are only needed when wandb.activate is set
+    import pandas as pd
+    import wandb
+
     wandb.init(config=args, project=args.wandb.project, entity=args.wandb.entity)
     outputs_df = pd.DataFrame(outputs)
     wandb.log({'result': outputs_df})
 
 
-@hydra.main(version_base=None, config_path=".", config_name="config")
-def main(cfg: DictConfig):
-    dataset = pd.read_csv(cfg.input_output.csv)
+def run_pipeline(cfg, profiler):
+    # timed on its own so the read_csv stage only covers reading the dataset
+    with profiler.stage('import_pandas'):
+        import pandas as pd
+
+    with profiler.stage('read_csv'):
+        dataset = pd.read_csv(cfg.input_output.csv)
     
     if True:
-        prompts = generate_prompts(dataset, cfg.running_params.shots)
-        outputs = run_llm(prompts, "", cfg.running_params.temperature,
-                        cfg.running_params.max_tokens, cfg.running_params.top_p, cfg.running_params.frequency_penalty,
-                        cfg.running_params.presence_penalty)
+        with profiler.stage('prompt_generation'):
+            prompts = generate_prompts(dataset, cfg.running_params.shots)
+        with profiler.stage('preflight'):
+            prompts = preflight_prompts(prompts, cfg.preflight.context_length,
+                                        cfg.running_params.max_tokens, cfg.preflight.on_overflow)
+        with profiler.stage('inference'):
+            outputs = run_llm(prompts, "", cfg.running_params.temperature,
+                            cfg.running_params.max_tokens, cfg.running_params.top_p, cfg.running_params.frequency_penalty,
+                            cfg.running_params.presence_penalty, concurrency=cfg.preflight.concurrency,
+                            profiler=profiler, context_length=cfg.preflight.context_length)
         
     elif cfg.running_params.llm == 'chatgpt':
         
@@ -44,20 +60,40 @@ def main(cfg: DictConfig):
         # 0 == not use COT
         COT = cfg.running_params.cot 
         
-        if COT == 0:
-            prompts = generate_prompts_chatgpt(dataset, cfg.running_params.shots)
-        elif COT == 1:
-            prompts = generate_prompts_chatgpt_COT(dataset, cfg.running_params.shots)
-            
-        outputs = run_llm_chatGPT(prompts, cfg.running_params.llm, cfg.running_params.temperature,
-                        cfg.running_params.max_tokens, cfg.running_params.top_p, cfg.running_params.frequency_penalty,
-                        cfg.running_params.presence_penalty)
+        with profiler.stage('prompt_generation'):
+            if COT == 0:
+                prompts = generate_prompts_chatgpt(dataset, cfg.running_params.shots)
+            elif COT == 1:
+                prompts = generate_prompts_chatgpt_COT(dataset, cfg.running_params.shots)
+
+        with profiler.stage('preflight'):
+            prompts = preflight_prompts(prompts, cfg.preflight.context_length,
+                                        cfg.running_params.max_tokens, cfg.preflight.on_overflow)
+        with profiler.stage('inference'):
+            outputs = run_llm_chatGPT(prompts, cfg.running_params.llm, cfg.running_params.temperature,
+                            cfg.running_params.max_tokens, cfg.running_params.top_p, cfg.running_params.frequency_penalty,
+                            cfg.running_params.presence_penalty, profiler=profiler,
+                            context_length=cfg.preflight.context_length)
          
         
-    save_results(outputs, cfg.input_output.output_folder)
+    with profiler.stage('save_results'):
+        save_results(outputs, cfg.input_output.output_folder)
 
     if cfg.wandb.activate:
-        save_results_wandb(outputs, cfg)
+        with profiler.stage('save_results_wandb'):
+            save_results_wandb(outputs, cfg)
+
+
+@hydra.main(version_base=None, config_path=".", config_name="config")
+def main(cfg: DictConfig):
+    profiler = Profiler(cfg.profiling.activate, cfg.profiling.cprofile)
+    profiler.start()
+    try:
+        run_pipeline(cfg, profiler)
+    finally:
+        # also on failure, a crashing run is the one worth diagnosing
+        profiler.stop()
+        profiler.write_report(cfg.input_output.output_folder, OmegaConf.to_container(cfg, resolve=True))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,119 @@
+import json
+import os
+import statistics
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+REPORT_FILE = 'run_report.json'
+PROFILE_FILE = 'profile.prof'
+
+
+class Profiler:
+    """Collects per-stage timings, per-request latencies and peak memory of a run.
+
+    Every method is a no-op when the profiler is not enabled, so the pipeline can
+    call it unconditionally.
+    """
+
+    def __init__(self, enabled=False, cprofile=False):
+        self.enabled = enabled
+        self.cprofile = enabled and cprofile
+        self.stages = {}
+        self.requests = []
+        self._lock = threading.Lock()
+        self._profile = None
+        self._started = None
+        self.total_s = None
+        self.peak_memory_bytes = None
+        self._peak_bytes = 0
+
+    def start(self):
+        if not self.enabled:
+            return
+        self._started = time.perf_counter()
+        tracemalloc.start()
+        if self.cprofile:
+            import cProfile
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def stop(self):
+        if not self.enabled or self._started is None:
+            return
+        if self._profile is not None:
+            self._profile.disable()
+        self.total_s = time.perf_counter() - self._started
+        self.peak_memory_bytes = max(self._peak_bytes, tracemalloc.get_traced_memory()[1])
+        self._started = None
+        tracemalloc.stop()
+
+    @contextmanager
+    def stage(self, name):
+        """Time a pipeline stage and record the peak memory reached while it ran."""
+        if not self.enabled:
+            yield
+            return
+        if hasattr(tracemalloc, 'reset_peak'):  # python >= 3.9
+            # reset_peak clears the one global peak, keep the run-level maximum ourselves
+            self._peak_bytes = max(self._peak_bytes, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = {"wall_s": time.perf_counter() - started,
+                                 "peak_memory_bytes": tracemalloc.get_traced_memory()[1]}
+
+    def record_request(self, name, latency_s, prompt_tokens=None, completion_tokens=None, generation_s=None):
+        """Record one model request.
+
+        generation_s is the time spent generating the completion as reported by the
+        server (Ollama's eval_duration); without it tokens/s falls back to the latency,
+        which also includes prompt evaluation and model loading.
+        """
+        if not self.enabled:
+            return
+        duration_s = generation_s or latency_s
+        request = {"name": name,
+                   "latency_s": latency_s,
+                   "generation_s": generation_s,
+                   "prompt_tokens": prompt_tokens,
+                   "completion_tokens": completion_tokens,
+                   "tokens_per_s": completion_tokens / duration_s if completion_tokens and duration_s else None}
+        with self._lock:
+            self.requests.append(request)
+
+    def summary(self):
+        latencies = sorted(r["latency_s"] for r in self.requests)
+        completion_tokens = sum(r["completion_tokens"] or 0 for r in self.requests)
+        if not latencies:
+            return {"n_requests": 0}
+        # requests overlap when preflight.concurrency > 1, so throughput is measured
+        # against the wall time of the whole inference stage
+        inference_s = self.stages.get('inference', {}).get('wall_s') or sum(latencies)
+        return {"n_requests": len(latencies),
+                "latency_mean_s": statistics.mean(latencies),
+                "latency_p50_s": latencies[len(latencies) // 2],
+                "latency_p95_s": latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)],
+                "latency_max_s": latencies[-1],
+                "completion_tokens": completion_tokens,
+                "tokens_per_s": completion_tokens / inference_s if completion_tokens else None}
+
+    def write_report(self, output_folder, run_config=None):
+        """Write the run report (and the cProfile dump if enabled) next to the outputs."""
+        if not self.enabled:
+            return
+        os.makedirs(output_folder, exist_ok=True)
+        report = {"created": time.strftime('%Y-%m-%dT%H:%M:%S'),
+                  "config": run_config,
+                  "total_s": self.total_s,
+                  "peak_memory_bytes": self.peak_memory_bytes,
+                  "stages": self.stages,
+                  "summary": self.summary(),
+                  "requests": self.requests}
+        with open(os.path.join(output_folder, REPORT_FILE), 'w') as f:
+            json.dump(report, f, indent=2)
+        if self._profile is not None:
+            self._profile.dump_stats(os.path.join(output_folder, PROFILE_FILE))
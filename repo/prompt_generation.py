@@ -1,3 +1,5 @@
+import math
+
 PROBLEM_STATEMENT = "Generate the lists of model classes and associations from a given description."
 
 TASK_DESCRIPTION = """Create a class diagram for the following description by giving the enumerations, classes, and relationships using format:
@@ -22,6 +24,16 @@ mul1 class1 contain mul2 class2 (class1 and2 are classes above. mul1 and mul2 ar
 
 SEP = '###'
 
+# Rough average for English text with BPE tokenizers; used when no local
+# tokenizer is available to estimate prompt sizes before dispatch.
+CHARS_PER_TOKEN = 4
+# Share of the prompt budget held back because the estimate above can be low;
+# Ollama silently drops the start of a prompt (problem statement, shots) that overflows num_ctx.
+TOKEN_ESTIMATE_MARGIN = 0.1
+# Trimming that would leave less of the description than this drops the prompt instead.
+MIN_DESCRIPTION_CHARS = 100
+OVERFLOW_ACTIONS = ("flag", "trim", "skip")
+
 
 def generate_prompts(dataset, shots):
     descriptions = list(dataset[~dataset.Name.isin(shots)]["Description"])
@@ -189,5 +201,69 @@ def generate_prompts_chatgpt_COT(dataset, shots):
     return prompt_list
 
 
+def estimate_tokens(prompt):
+    """Approximate the token count of a string prompt or a list of chat messages."""
+    if isinstance(prompt, str):
+        text = prompt
+    else:
+        text = ''.join(message["content"] for message in prompt)
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _trim_prompt(prompt, description, excess_tokens):
+    """Cut excess_tokens worth of characters from the description at the end of the prompt."""
+    excess_chars = excess_tokens * CHARS_PER_TOKEN
+    if len(description) - excess_chars < MIN_DESCRIPTION_CHARS:
+        # the header/shots take up (almost) the whole budget, too little of the task would be left
+        return None
+    if isinstance(prompt, str):
+        return prompt.rstrip('\n')[:-excess_chars] + '\n'
+    last = prompt[-1]
+    return prompt[:-1] + [{**last, "content": last["content"][:-excess_chars]}]
+
+
+def preflight_prompts(prompts, context_length, max_new_tokens, on_overflow="flag"):
+    """Estimate prompt sizes and handle prompts that would overflow the model context.
+
+    on_overflow is one of "flag" (warn and send anyway), "trim" (cut the end of the
+    description so the prompt fits) or "skip" (drop the prompt before dispatch).
+    In "trim" mode, prompts that would keep less than MIN_DESCRIPTION_CHARS of their
+    description are dropped like in "skip" mode.
+    Every kept prompt gets a "prompt_tokens" estimate and "truncated" flag.
+    """
+    if on_overflow not in OVERFLOW_ACTIONS:
+        raise ValueError(f"on_overflow must be one of {OVERFLOW_ACTIONS}, got {on_overflow!r}")
+    if context_length <= max_new_tokens:
+        raise ValueError(f"context_length ({context_length}) leaves no room for the prompt "
+                         f"after max_tokens ({max_new_tokens})")
+    budget = int((context_length - max_new_tokens) * (1 - TOKEN_ESTIMATE_MARGIN))
+    checked = []
+    for dic in prompts:
+        n_tokens = estimate_tokens(dic["prompt"])
+        dic["truncated"] = False
+        if n_tokens > budget:
+            print(f"Prompt {dic['name']} needs ~{n_tokens} tokens, budget is {budget}")
+            if on_overflow == "skip":
+                continue
+            if on_overflow == "trim":
+                trimmed = _trim_prompt(dic["prompt"], dic["description"], n_tokens - budget)
+                if trimmed is None:
+                    print(f"Skipping prompt {dic['name']}: trimming it to the budget would leave "
+                          f"less than {MIN_DESCRIPTION_CHARS} characters of the description")
+                    continue
+                dic["prompt"] = trimmed
+                dic["truncated"] = True
+                n_tokens = estimate_tokens(trimmed)
+        dic["prompt_tokens"] = n_tokens
+        checked.append(dic)
+    return checked
+
+
+def bucket_by_length(prompts, bucket_size):
+    """Sort prompts by estimated length and group them into buckets of bucket_size."""
+    ordered = sorted(prompts, key=lambda dic: dic.get("prompt_tokens", estimate_tokens(dic["prompt"])))
+    return [ordered[i:i + bucket_size] for i in range(0, len(ordered), bucket_size)]
+
+
 if __name__ == "__main__":
     pass
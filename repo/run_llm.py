@@ -1,9 +1,10 @@
 import json
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-import openai
-import requests
-from tqdm import tqdm
+from prompt_generation import SEP
+from prompt_generation import bucket_by_length
 
 # openai.api_key = os.environ['OPEN_AI_TOKEN']
 # HF_TOKEN = os.environ['HF_TOKEN']
@@ -12,22 +13,53 @@ CHAT_GPT_OPEN_AI_ENGINE = 'text-chat-davinci-002-20221122'
 API_URL = "https://api-inference.huggingface.co/models"
 
 
-def query_hf(payload, model, parameters=None, options={'use_cache': False}):
+def ollama_options(temperature, max_tokens, top_p, context_length=None):
+    """Ollama generation options matching the limits the preflight budgeted for."""
+    parameters = {"temperature": temperature,
+                  "top_p": top_p,
+                  "num_predict": max_tokens,
+                  # few-shot prompts separate the shots with SEP, stop before the model invents another one
+                  "stop": [SEP]}
+    if context_length is not None:
+        parameters["num_ctx"] = context_length
+    return parameters
+
+
+def query_hf(payload, model, parameters=None, options={'use_cache': False}, profiler=None):
+    import requests
+
+    if parameters and isinstance(payload, dict):
+        payload = {**payload, "options": parameters}
+
+    started = time.perf_counter()
     response = requests.post("http://localhost:11434/api/generate", json=payload)
+    latency = time.perf_counter() - started
 
     if response.status_code == 200:
-        return response.json()["response"]
+        body = response.json()
+        if profiler is not None:
+            eval_duration = body.get("eval_duration")  # nanoseconds
+            profiler.record_request(payload.get("name") if isinstance(payload, dict) else None, latency,
+                                    body.get("prompt_eval_count"), body.get("eval_count"),
+                                    eval_duration / 1e9 if eval_duration else None)
+        return body["response"]
     else:
         print(f"response: {response}")
         print(f"Error calling LLM: {response.status_code} {response.reason}")
         raise Exception
 
 
-def run_llm(prompts, llm, temperature, max_tokens, top_p, frequency_penalty, presence_penalty):
+def run_llm(prompts, llm, temperature, max_tokens, top_p, frequency_penalty, presence_penalty, concurrency=1,
+            profiler=None, context_length=None):
+    from tqdm import tqdm
+
     generated_texts = []
     if llm == 'gpt3' or llm == 'chatgpt':
+        import openai
+
         engine = GPT3_OPEN_AI_ENGINE if llm == 'gpt3' else CHAT_GPT_OPEN_AI_ENGINE
         for dic in tqdm(prompts, desc='Inference'):
+            started = time.perf_counter()
             response = openai.Completion.create(
                 engine=engine,
                 prompt=dic["prompt"],
@@ -37,43 +69,53 @@ def run_llm(prompts, llm, temperature, max_tokens, top_p, frequency_penalty, pre
                 frequency_penalty=frequency_penalty,
                 presence_penalty=presence_penalty
             )
+            if profiler is not None:
+                profiler.record_request(dic["name"], time.perf_counter() - started,
+                                        response['usage']['prompt_tokens'], response['usage']['completion_tokens'])
             generated_text = response['choices'][0]['text']
             generated_texts.append({"description": dic["description"],
                                     "generated_text": generated_text,
                                     "name": dic["name"],
-                                    "prompt": dic["prompt"]})
+                                    "prompt": dic["prompt"],
+                                    "truncated": dic.get("truncated", False)})
     else:
-        for dic in tqdm(prompts, desc='Inference'):
-            parameters = {
-                "max_new_tokens": 250,
-                # TODO max_new_tokens is harcoded
-                # TODO we will have problems with the length of the input sequences
-                "temperature": temperature,
-                'end_sequence': "###"
-                # TODO, this is also harcoded
-                # TODO penalty, top_p, and other parameters
-            }
-            response = query_hf(payload=dic,
-                                model=llm,
-                                parameters=parameters,
-                                options={'use_cache': False})
-
-            # TODO here, the response also includes the prompt :(
-            generated_texts.append({"description": dic["description"],
-                                    "generated_text": response,
-                                    "name": dic["name"],
-                                    "prompt": dic["prompt"]})
+        parameters = ollama_options(temperature, max_tokens, top_p, context_length)
+
+        def query(dic):
+            return query_hf(payload=dic,
+                            model=llm,
+                            parameters=parameters,
+                            options={'use_cache': False},
+                            profiler=profiler)
+
+        # prompts of similar length are sent together so a batch is not held up by one long straggler
+        with ThreadPoolExecutor(max_workers=concurrency) as pool, \
+                tqdm(total=len(prompts), desc='Inference') as progress:
+            for bucket in bucket_by_length(prompts, concurrency):
+                for dic, response in zip(bucket, pool.map(query, bucket)):
+                    # TODO here, the response also includes the prompt :(
+                    generated_texts.append({"description": dic["description"],
+                                            "generated_text": response,
+                                            "name": dic["name"],
+                                            "prompt": dic["prompt"],
+                                            "truncated": dic.get("truncated", False)})
+                progress.update(len(bucket))
     return generated_texts
 
 
 
-def run_llm_chatGPT(prompts, llm, temperature, max_tokens, top_p, frequency_penalty, presence_penalty):
+def run_llm_chatGPT(prompts, llm, temperature, max_tokens, top_p, frequency_penalty, presence_penalty,
+                    profiler=None, context_length=None):
+    from tqdm import tqdm
+
     generated_texts = []    
     # for dic in tqdm(prompts, desc='Inference'):
     #     print(dic['prompt'])
     #     return
     
     if llm == 'chatgpt':
+        import openai
+
         for dic in tqdm(prompts, desc='Inference'):            
             # for ele in dic['prompt']:
             #     print(str(ele))
@@ -81,31 +123,34 @@ def run_llm_chatGPT(prompts, llm, temperature, max_tokens, top_p, frequency_pena
             # return
             
             # see documentation at https://platform.openai.com/docs/guides/chat
+            started = time.perf_counter()
             completion = openai.ChatCompletion.create(
                 model="gpt-3.5-turbo",
-                messages=dic['prompt']
+                messages=dic['prompt'],
+                temperature=temperature,
+                max_tokens=max_tokens,
+                top_p=top_p,
+                frequency_penalty=frequency_penalty,
+                presence_penalty=presence_penalty
             )
+            if profiler is not None:
+                profiler.record_request(dic["name"], time.perf_counter() - started,
+                                        completion['usage']['prompt_tokens'], completion['usage']['completion_tokens'])
 
             generated_text = completion['choices'][0]['message']['content']
             generated_texts.append({"description": dic["description"],
                                     "generated_text": generated_text,
                                     "name": dic["name"],
-                                    "prompt": str(dic["prompt"]) })
+                                    "prompt": str(dic["prompt"]),
+                                    "truncated": dic.get("truncated", False)})
     else:
+        parameters = ollama_options(temperature, max_tokens, top_p, context_length)
         for dic in tqdm(prompts, desc='Inference'):
-            parameters = {
-                "max_new_tokens": 250,
-                # TODO max_new_tokens is harcoded
-                # TODO we will have problems with the length of the input sequences
-                "temperature": temperature,
-                'end_sequence': "###"
-                # TODO, this is also harcoded
-                # TODO penalty, top_p, and other parameters
-            }
             response = query_hf(payload=dic["prompt"],
                                 model=llm,
                                 parameters=parameters,
-                                options={'use_cache': False})
+                                options={'use_cache': False},
+                                profiler=profiler)
             print("Response: ", response)
             print("Response: ", response)
             print("Response: ", response)
@@ -113,11 +158,13 @@ def run_llm_chatGPT(prompts, llm, temperature, max_tokens, top_p, frequency_pena
             generated_texts.append({"description": dic["description"],
                                     "generated_text": response[0]['generated_text'][len(dic["prompt"]):],
                                     "name": dic["name"],
-                                    "prompt": dic["prompt"]})
+                                    "prompt": dic["prompt"],
+                                    "truncated": dic.get("truncated", False)})
     return generated_texts
 
 
 def test_chatgpt():
+    import openai
 
     completion = openai.ChatCompletion.create(
         model="gpt-3.5-turbo",
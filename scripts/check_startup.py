@@ -0,0 +1,50 @@
+"""Import-time budget check for the CLI entry points.
+
+Imports one module and fails if that takes longer than the budget or if it
+pulls in an LLM/W&B backend that only some runs need.
+
+    python scripts/check_startup.py main
+    python scripts/check_startup.py --dir repo --preload hydra omegaconf -- main
+"""
+import argparse
+import importlib
+import os
+import sys
+import time
+
+HEAVY_MODULES = ('openai', 'requests', 'tqdm', 'pandas', 'wandb')
+DEFAULT_BUDGET_S = 0.5
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("module", help="module to import")
+    parser.add_argument("--dir", default=".", help="directory the module lives in")
+    parser.add_argument("--preload", nargs="*", default=[],
+                        help="modules imported before timing starts, excluded from the check")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET_S, help="budget in seconds")
+    args = parser.parse_args()
+
+    os.chdir(args.dir)
+    sys.path.insert(0, os.getcwd())
+    for name in args.preload:
+        importlib.import_module(name)
+
+    started = time.perf_counter()
+    importlib.import_module(args.module)
+    elapsed = time.perf_counter() - started
+
+    label = os.path.normpath(os.path.join(args.dir, args.module))
+    heavy = [name for name in HEAVY_MODULES if name in sys.modules and name not in args.preload]
+    if heavy:
+        print(f"{label}: eagerly imported {', '.join(heavy)}")
+        return 1
+    if elapsed >= args.budget:
+        print(f"{label}: imported in {elapsed:.3f}s, budget is {args.budget:.3f}s")
+        return 1
+    print(f"{label}: {elapsed:.3f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())